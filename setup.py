@@ -1,20 +1,55 @@
 #!/bin/env python
 import os
+from collections import defaultdict
+from functools import lru_cache
 
 from setuptools import setup
 
 
-def find_xdg_data_files(syspath, relativepath, pkgname, data_files=[]):
-    for (dirname, _, filenames) in os.walk(relativepath):
-        if filenames:
-            syspath = syspath.format(pkgname=pkgname)
+_WALK_CACHE = {}
 
-            subpath = dirname.split(relativepath)[1]
-            if subpath.startswith("/"):
-                subpath = subpath[1:]
 
-            files = [os.path.join(dirname, f) for f in filenames]
-            data_files.append((os.path.join(syspath, subpath), files))
+def walk_data_dir(relativepath):
+    if relativepath in _WALK_CACHE:
+        return _WALK_CACHE[relativepath]
+
+    result = []
+    stack = [relativepath]
+
+    while stack:
+        dirname = stack.pop()
+        files = []
+
+        try:
+            entries = os.scandir(dirname)
+        except OSError:
+            continue
+
+        with entries:
+            for entry in entries:
+                if entry.is_file():
+                    files.append(entry.path)
+                elif entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+
+        if files:
+            result.append((dirname, sorted(files)))
+
+    result.sort()
+    _WALK_CACHE[relativepath] = result
+    return result
+
+
+def find_xdg_data_files(syspath, relativepath, pkgname, data_files=None):
+    data_files = [] if data_files is None else data_files
+    syspath = syspath.format(pkgname=pkgname)
+
+    for (dirname, files) in walk_data_dir(relativepath):
+        subpath = os.path.relpath(dirname, relativepath)
+        if subpath == ".":
+            subpath = ""
+
+        data_files.append((os.path.join(syspath, subpath), list(files)))
 
     return data_files
 
@@ -25,7 +60,11 @@ def find_data_files(data_map, pkgname):
     for (syspath, relativepath) in data_map:
         find_xdg_data_files(syspath, relativepath, pkgname, data_files)
 
-    return data_files
+    merged = defaultdict(list)
+    for (target, files) in data_files:
+        merged[os.path.normpath(target)].extend(files)
+
+    return list(merged.items())
 
 
 DATA_FILES = [
@@ -34,18 +73,25 @@ DATA_FILES = [
 ]
 
 
-setup(
-    author="Elio Esteves Duarte",
-    author_email="elio.esteves.duarte@gmail.com",
-    description="Shows a fulls creen window which prevents users from using the computer during a break",
-    include_package_data=True,
-    keywords="pomodoro,tomate",
-    license="GNU General Public License v2.0",
-    long_description=open("README.md").read(),
-    name="tomate-breakscreen-plugin",
-    data_files=find_data_files(DATA_FILES, "tomate"),
-    url="https://github.com/eliostva/tomate-breakscreen-plugin",
-    version="0.6.2",
-    zip_safe=False,
-    py_modules=[],
-)
+@lru_cache(maxsize=1)
+def _long_description():
+    with open("README.md", encoding="utf-8") as f:
+        return f.read()
+
+
+if __name__ == "__main__":
+    setup(
+        author="Elio Esteves Duarte",
+        author_email="elio.esteves.duarte@gmail.com",
+        description="Shows a fulls creen window which prevents users from using the computer during a break",
+        include_package_data=True,
+        keywords="pomodoro,tomate",
+        license="GNU General Public License v2.0",
+        long_description=_long_description(),
+        name="tomate-breakscreen-plugin",
+        data_files=find_data_files(DATA_FILES, "tomate"),
+        url="https://github.com/eliostva/tomate-breakscreen-plugin",
+        version="0.6.2",
+        zip_safe=False,
+        py_modules=[],
+    )
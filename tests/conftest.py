@@ -0,0 +1,8 @@
+import pytest
+
+
+@pytest.fixture(scope="session")
+def session_spec():
+    from tomate.pomodoro import Session
+
+    return dir(Session)
@@ -1,10 +1,13 @@
+import os
 import random
-from typing import Iterator
+import sys
+import time
+from typing import Callable, Iterator
 
 import pytest
 from gi.repository import Gtk
-from tomate.pomodoro import Bus, Config, ConfigPayload, Events, Session, SessionType, TimerPayload
-from tomate.ui.testing import Q, create_session_payload, run_loop_for
+from tomate.pomodoro import Bus, Config, ConfigPayload, Events, SessionType, TimerPayload
+from tomate.ui.testing import Q, create_session_payload
 from wiring import Graph
 
 SECTION_NAME = "break_screen"
@@ -12,20 +15,31 @@ SKIP_BREAK_OPTION = "skip_break"
 AUTO_START_OPTION = "auto_start"
 
 
-@pytest.fixture
+def has_display() -> bool:
+    if not os.environ.get("DISPLAY") and not os.environ.get("WAYLAND_DISPLAY"):
+        return False
+
+    initialized, _ = Gtk.init_check(sys.argv)
+    return initialized
+
+
+pytestmark = pytest.mark.skipif(not has_display(), reason="no display")
+
+
+@pytest.fixture(scope="module")
 def bus() -> Bus:
     return Bus()
 
 
-@pytest.fixture
-def config(bus, tmpdir) -> Config:
+@pytest.fixture(scope="module")
+def config(bus, tmp_path_factory) -> Config:
     instance = Config(bus)
-    tmp_path = tmpdir.mkdir("tomate").join("tomate.config")
-    instance.config_path = lambda: tmp_path.strpath
+    tmp_path = tmp_path_factory.mktemp("tomate").joinpath("tomate.config")
+    instance.config_path = lambda: str(tmp_path)
     return instance
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def graph() -> Graph:
     instance = Graph()
     instance.register_instance(Graph, instance)
@@ -33,16 +47,17 @@ def graph() -> Graph:
 
 
 @pytest.fixture
-def session(mocker):
-    return mocker.Mock(spec=Session)
+def session(mocker, session_spec):
+    instance = mocker.Mock()
+    instance.mock_add_spec(session_spec, spec_set=True)
+    return instance
 
 
-@pytest.fixture
-def plugin(bus, config, graph, session):
+@pytest.fixture(scope="module")
+def plugin(bus, config, graph):
     graph.providers.clear()
     graph.register_instance("tomate.bus", bus)
     graph.register_instance("tomate.config", config)
-    graph.register_instance("tomate.session", session)
 
     import breakscreen_plugin
 
@@ -51,83 +66,113 @@ def plugin(bus, config, graph, session):
     return instance
 
 
-def none(values: Iterator) -> bool:
-    return all([value is False for value in values])
+@pytest.fixture
+def active_plugin(plugin):
+    plugin.activate()
+    yield plugin
+    plugin.deactivate()
 
 
-def label_text(countdown: str, plugin) -> bool:
-    return len(plugin.screens) > 0 and all(
-        [Q.select(screen.widget, Q.props("name", "countdown")).get_text() == countdown for screen in plugin.screens]
-    )
+@pytest.fixture(autouse=True)
+def reset(plugin, config, graph, session):
+    plugin.deactivate()
+    config.remove(SECTION_NAME, AUTO_START_OPTION)
+    config.remove(SECTION_NAME, SKIP_BREAK_OPTION)
 
+    graph.providers.pop("tomate.session", None)
+    graph.register_instance("tomate.session", session)
 
-class TestPlugin:
-    @pytest.mark.parametrize("session_type", [SessionType.SHORT_BREAK, SessionType.LONG_BREAK])
-    def test_shows_when_pause_begins(self, session_type, bus, plugin):
-        plugin.activate()
+    yield
 
-        payload = create_session_payload(type=session_type)
-        bus.send(Events.SESSION_START, payload=payload)
+    plugin.deactivate()
 
-        assert all([screen.widget.props.visible for screen in plugin.screens])
-        assert label_text(payload.countdown, plugin)
 
-    def test_not_show_when_pomodoro_begins(self, bus, plugin):
-        plugin.activate()
+@pytest.fixture
+def options(request, config) -> Config:
+    for option, value in getattr(request, "param", {}).items():
+        if value is None:
+            config.remove(SECTION_NAME, option)
+        else:
+            config.set(SECTION_NAME, option, value)
 
-        payload = create_session_payload(type=SessionType.POMODORO)
-        bus.send(Events.SESSION_START, payload=payload)
+    return config
 
-        assert none([screen.widget.props.visible for screen in plugin.screens])
 
-    def test_hides_when_plugin_is_deactivated(self, bus, plugin):
-        plugin.activate()
+def run_loop_until(predicate: Callable[[], bool], timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        Gtk.main_iteration_do(False)
+    return predicate()
 
-        payload = create_session_payload(type=SessionType.SHORT_BREAK)
-        bus.send(Events.SESSION_START, payload=payload)
 
-        plugin.deactivate()
+def none(values: Iterator) -> bool:
+    return all(value is False for value in values)
 
-        assert none([screen.widget.props.visible for screen in plugin.screens])
 
-    def test_starts_break_when_auto_start_option_is_enabled(self, bus, config, plugin, session):
-        config.set(SECTION_NAME, AUTO_START_OPTION, "true")
+def label_text(countdown: str, plugin) -> bool:
+    screens = plugin.screens
+    return len(screens) > 0 and all(
+        Q.select(screen.widget, Q.props("name", "countdown")).get_text() == countdown for screen in screens
+    )
 
-        plugin.activate()
 
-        payload = create_session_payload(type=SessionType.POMODORO)
-        bus.send(Events.SESSION_END, payload=payload)
+class TestPlugin:
+    @pytest.mark.parametrize(
+        "session_type, action, expected_visible",
+        [
+            (SessionType.SHORT_BREAK, None, True),
+            (SessionType.LONG_BREAK, None, True),
+            (SessionType.SHORT_BREAK, "deactivate", False),
+            (SessionType.POMODORO, None, False),
+            (SessionType.SHORT_BREAK, "interrupt", False),
+        ],
+    )
+    def test_screen_visibility_when_session_starts(self, session_type, action, expected_visible, bus, active_plugin):
+        screens = list(active_plugin.screens)
 
-        run_loop_for(1)
+        payload = create_session_payload(type=session_type)
+        bus.send(Events.SESSION_START, payload=payload)
 
-        session.start.assert_called_once()
+        if action == "deactivate":
+            active_plugin.deactivate()
+        elif action == "interrupt":
+            bus.send(Events.SESSION_INTERRUPT, payload=create_session_payload())
 
-    def test_not_start_break_when_auto_start_is_disabled(self, bus, config, plugin, session):
-        config.set(SECTION_NAME, AUTO_START_OPTION, "false")
+        if expected_visible:
+            assert all(screen.widget.props.visible for screen in screens)
+            assert label_text(payload.countdown, active_plugin)
+        else:
+            assert none(screen.widget.props.visible for screen in screens)
 
+    @pytest.mark.parametrize("options", [{AUTO_START_OPTION: "true"}], indirect=True)
+    def test_starts_break_when_auto_start_option_is_enabled(self, bus, options, plugin, session):
         plugin.activate()
 
         payload = create_session_payload(type=SessionType.POMODORO)
         bus.send(Events.SESSION_END, payload=payload)
 
-        session.start.assert_not_called()
+        run_loop_until(lambda: session.start.called)
 
-        assert none([screen.widget.props.visible for screen in plugin.screens])
+        session.start.assert_called_once()
 
-    def test_hides_when_session_is_interrupted(self, bus, plugin):
+    @pytest.mark.parametrize("options", [{AUTO_START_OPTION: "false"}], indirect=True)
+    def test_not_start_break_when_auto_start_is_disabled(self, bus, options, plugin, session):
         plugin.activate()
 
-        bus.send(Events.SESSION_START, payload=create_session_payload(type=SessionType.SHORT_BREAK))
-        bus.send(Events.SESSION_INTERRUPT, payload=create_session_payload())
+        payload = create_session_payload(type=SessionType.POMODORO)
+        bus.send(Events.SESSION_END, payload=payload)
 
-        assert none([screen.widget.props.visible for screen in plugin.screens])
+        session.start.assert_not_called()
+
+        assert none(screen.widget.props.visible for screen in plugin.screens)
 
+    @pytest.mark.parametrize("options", [{AUTO_START_OPTION: "True"}], indirect=True)
     @pytest.mark.parametrize("session_type", [SessionType.SHORT_BREAK, SessionType.LONG_BREAK])
-    def test_not_start_break_when_is_not_a_pomodoro(self, session_type, bus, config, plugin, session):
-        config.set(SECTION_NAME, AUTO_START_OPTION, "True")
+    def test_not_start_break_when_is_not_a_pomodoro(self, session_type, bus, options, plugin, session):
         plugin.activate()
+        screens = plugin.screens
 
-        for screen in plugin.screens:
+        for screen in screens:
             screen.widget.show()
 
         payload = create_session_payload(type=session_type)
@@ -135,35 +180,34 @@ class TestPlugin:
 
         session.start.assert_not_called()
 
-        assert none([screen.widget.props.visible for screen in plugin.screens])
-
-    def test_updates_countdown(self, bus, plugin):
-        plugin.activate()
+        assert none(screen.widget.props.visible for screen in screens)
 
+    def test_updates_countdown(self, bus, active_plugin):
         time_left = random.randint(1, 100)
 
         payload = TimerPayload(time_left=time_left, duration=150)
         bus.send(Events.TIMER_UPDATE, payload=payload)
 
-        assert label_text(payload.countdown, plugin)
+        assert label_text(payload.countdown, active_plugin)
 
     @pytest.mark.parametrize(
-        "action,option,initial,value,want",
+        "action,option,options,value,want",
         [
-            ("set", AUTO_START_OPTION, "false", "true", True),
-            ("remove", AUTO_START_OPTION, "true", "", False),
-            ("set", SKIP_BREAK_OPTION, "false", "true", True),
-            ("remove", SKIP_BREAK_OPTION, "true", "", False),
+            ("set", AUTO_START_OPTION, {AUTO_START_OPTION: "false"}, "true", True),
+            ("remove", AUTO_START_OPTION, {AUTO_START_OPTION: "true"}, "", False),
+            ("set", SKIP_BREAK_OPTION, {SKIP_BREAK_OPTION: "false"}, "true", True),
+            ("remove", SKIP_BREAK_OPTION, {SKIP_BREAK_OPTION: "true"}, "", False),
         ],
+        ids=["set-auto-start", "remove-auto-start", "set-skip-break", "remove-skip-break"],
+        indirect=["options"],
     )
-    def test_updates_when_config_changes(self, action, option, initial, value, want, bus, config, plugin):
-        config.set(SECTION_NAME, option, initial)
+    def test_updates_when_config_changes(self, action, option, options, value, want, bus, plugin):
         plugin.activate()
 
         payload = ConfigPayload(action, SECTION_NAME, option, value)
         bus.send(Events.CONFIG_CHANGE, payload=payload)
 
-        assert all([screen.options[option] == want for screen in plugin.screens])
+        assert all(screen.options[option] == want for screen in plugin.screens)
 
     @pytest.mark.parametrize(
         "action, want",
@@ -172,13 +216,11 @@ class TestPlugin:
             ("remove", False),
         ],
     )
-    def test_hide_skip_button_when_config_changes(self, action, want, bus, plugin):
-        plugin.activate()
-
+    def test_hide_skip_button_when_config_changes(self, action, want, bus, active_plugin):
         payload = ConfigPayload(action, SECTION_NAME, SKIP_BREAK_OPTION, "")
         bus.send(Events.CONFIG_CHANGE, payload=payload)
 
-        assert all([screen.skip_button.props.visible == want for screen in plugin.screens])
+        assert all(screen.skip_button.props.visible == want for screen in active_plugin.screens)
 
 
 class TestSettingsWindow:
@@ -188,28 +230,22 @@ class TestSettingsWindow:
         assert Q.select(dialog.widget, Q.props("label", "Auto start:")) is not None
         assert Q.select(dialog.widget, Q.props("label", "Skip break:")) is not None
 
-    def test_with_all_options_enabled(self, config, plugin):
-        config.set(SECTION_NAME, AUTO_START_OPTION, "true")
-        config.set(SECTION_NAME, SKIP_BREAK_OPTION, "true")
-
+    @pytest.mark.parametrize("options", [{AUTO_START_OPTION: "true", SKIP_BREAK_OPTION: "true"}], indirect=True)
+    def test_with_all_options_enabled(self, options, plugin):
         dialog = plugin.settings_window(Gtk.Window())
 
         assert Q.select(dialog.widget, Q.props("name", AUTO_START_OPTION)).props.active is True
         assert Q.select(dialog.widget, Q.props("name", SKIP_BREAK_OPTION)).props.active is True
 
-    def test_with_all_options_disabled(self, config, plugin):
-        config.remove(SECTION_NAME, AUTO_START_OPTION)
-        config.remove(SECTION_NAME, SKIP_BREAK_OPTION)
-
+    @pytest.mark.parametrize("options", [{AUTO_START_OPTION: None, SKIP_BREAK_OPTION: None}], indirect=True)
+    def test_with_all_options_disabled(self, options, plugin):
         dialog = plugin.settings_window(Gtk.Window())
 
         assert Q.select(dialog.widget, Q.props("name", AUTO_START_OPTION)).props.active is False
         assert Q.select(dialog.widget, Q.props("name", SKIP_BREAK_OPTION)).props.active is False
 
-    def test_change_options(self, config, plugin):
-        config.remove(SECTION_NAME, AUTO_START_OPTION)
-        config.remove(SECTION_NAME, SKIP_BREAK_OPTION)
-
+    @pytest.mark.parametrize("options", [{AUTO_START_OPTION: None, SKIP_BREAK_OPTION: None}], indirect=True)
+    def test_change_options(self, options, config, plugin):
         dialog = plugin.settings_window(Gtk.Window())
 
         Q.select(dialog.widget, Q.props("name", AUTO_START_OPTION)).props.active = True